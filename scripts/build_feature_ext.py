@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Ahead-of-time compile the classify.py feature kernel with numba.pycc
+Produces the feature_ext extension module next to this script; classify.py
+imports it when present instead of JIT-compiling on every run
+"""
+
+import os
+import sys
+
+from numba.pycc import CC
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from classify import build_features_impl
+
+
+def main():
+    """Main entry point"""
+    cc = CC('feature_ext')
+    cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    # Packed uint16 band block, flat valid-pixel indices, float32 features
+    cc.export('build_features', 'void(u2[:, :], i8[:], f4[:, :])')(build_features_impl)
+    
+    cc.compile()
+    print(f"[Build] Compiled feature_ext into {cc.output_dir}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
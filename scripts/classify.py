@@ -1,36 +1,86 @@
 #!/usr/bin/env python3
 """
 Real ML Classification using rasterio and scikit-learn
-Applies trained Random Forest model pixel-by-pixel to satellite imagery
+Applies a trained Random Forest, Histogram Gradient Boosting or MLP model
+pixel-by-pixel to satellite imagery
 """
 
 import sys
 import json
 import os
 import tempfile
+import importlib.util
+import multiprocessing
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 
+# Numba is optional: without it the feature kernel falls back to NumPy
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
 # Suppress warnings
 import warnings
 warnings.filterwarnings('ignore')
 
-def search_stac_for_point(collection, lon, lat, datetime_range=None):
-    """Search STAC for imagery covering a specific point"""
+# GDAL settings for remote COG reads: skip sidecar/directory probes, merge
+# and multiplex range requests, and cache fetched blocks
+GDAL_ENV_OPTIONS = {
+    'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+    'CPL_VSIL_CURL_USE_HEAD': 'NO',
+    'CPL_VSIL_CURL_ALLOWED_EXTENSIONS': '.tif',
+    'GDAL_HTTP_MERGE_CONSECUTIVE_RANGES': 'YES',
+    'GDAL_HTTP_MULTIPLEX': 'YES',
+    'GDAL_HTTP_VERSION': '2',
+    'VSI_CACHE': 'TRUE',
+    # Per open file handle; overview reads at <= MAX_DIM need only a few MB
+    'VSI_CACHE_SIZE': '67108864',
+    # rasterio requires an int here (MB)
+    'GDAL_CACHEMAX': 512
+}
+
+
+@contextmanager
+def open_remote(url):
+    """Open a remote raster under GDAL_ENV_OPTIONS (safe to call from any thread)"""
+    import rasterio
+    with rasterio.Env(**GDAL_ENV_OPTIONS), rasterio.open(url) as src:
+        yield src
+
+
+@lru_cache(maxsize=256)
+def _sign_blob_url(url):
+    """Request a SAS-signed URL from Planetary Computer (memoized per href)"""
+    import planetary_computer as pc
+    return pc.sign(url)
+
+
+def sign_url(url):
+    """Sign URL if needed (Planetary Computer), falling back to the raw href"""
+    if 'blob.core.windows.net' not in url:
+        return url
+    try:
+        return _sign_blob_url(url)
+    except:
+        return url
+
+
+def search_stac_items(collection, bbox, limit=50, datetime_range=None):
+    """Search STAC for imagery intersecting a bbox"""
     import urllib.request
-    import urllib.parse
     
     # Build search URL
     base_url = "https://earth-search.aws.element84.com/v1/search"
     
-    # Create small bbox around point
-    delta = 0.01
-    bbox = [lon - delta, lat - delta, lon + delta, lat + delta]
-    
     params = {
         "collections": [collection],
         "bbox": bbox,
-        "limit": 1,
+        "limit": limit,
         "query": {"eo:cloud_cover": {"lt": 30}}
     }
     
@@ -45,13 +95,267 @@ def search_stac_for_point(collection, lon, lat, datetime_range=None):
         )
         with urllib.request.urlopen(req, timeout=30) as response:
             result = json.loads(response.read().decode())
-            features = result.get('features', [])
-            if features:
-                return features[0]
+            return result.get('features', [])
     except Exception as e:
-        print(f"[Classify] STAC search failed for ({lat}, {lon}): {e}", file=sys.stderr)
+        print(f"[Classify] STAC search failed for bbox {bbox}: {e}", file=sys.stderr)
+    
+    return []
+
+
+def item_footprint_contains(item):
+    """Build a lon/lat containment test for a STAC item's footprint"""
+    geometry = item.get('geometry')
+    if geometry:
+        try:
+            from shapely.geometry import shape, Point
+            footprint = shape(geometry)
+            return lambda lon, lat: footprint.contains(Point(lon, lat))
+        except ImportError:
+            pass
+    
+    # Without shapely (or a geometry), fall back to the item bbox
+    bbox = item.get('bbox')
+    if not bbox:
+        return lambda lon, lat: False
+    return lambda lon, lat: bbox[0] <= lon <= bbox[2] and bbox[1] <= lat <= bbox[3]
+
+
+# Guards normalized-difference denominators against 0 (compile-time constant)
+INDEX_EPS = np.float32(1e-10)
+
+
+def build_features_impl(bands, idx, out):
+    """
+    Fill the feature matrix for the pixels at flat indices `idx` in one pass
+    
+    `bands` is a packed (6, H*W) block of red, green, blue, nir, swir16 and
+    swir22 rows, typically uint16 DNs widened to float32 per pixel.
+    Columns 0-5 are the raw bands; when `out` has 10 columns, 6-9 are
+    NDVI, NDWI, NDBI and EVI.
+    """
+    with_indices = out.shape[1] > 6
+    for i in prange(idx.size):
+        p = idx[i]
+        r = np.float32(bands[0, p])
+        g = np.float32(bands[1, p])
+        b = np.float32(bands[2, p])
+        n = np.float32(bands[3, p])
+        s = np.float32(bands[4, p])
+        
+        out[i, 0] = r
+        out[i, 1] = g
+        out[i, 2] = b
+        out[i, 3] = n
+        out[i, 4] = s
+        out[i, 5] = np.float32(bands[5, p])
+        
+        if with_indices:
+            # float32 constants keep the math in single precision, and
+            # reciprocals let fastmath lower them to rcp + Newton step
+            inv_nr = np.float32(1.0) / (n + r + INDEX_EPS)
+            inv_gn = np.float32(1.0) / (g + n + INDEX_EPS)
+            inv_sn = np.float32(1.0) / (s + n + INDEX_EPS)
+            # The EVI denominator can be exactly zero (e.g. a bright blue
+            # pixel); report EVI 0 there instead of dividing by zero
+            evi_denom = n + np.float32(6.0) * r - np.float32(7.5) * b + np.float32(10000.0)
+            inv_evi = np.float32(1.0) / evi_denom if evi_denom != np.float32(0.0) else np.float32(0.0)
+            
+            n_minus_r = n - r
+            out[i, 6] = n_minus_r * inv_nr  # NDVI
+            out[i, 7] = (g - n) * inv_gn  # NDWI
+            out[i, 8] = (s - n) * inv_sn  # NDBI
+            out[i, 9] = np.float32(2.5) * n_minus_r * inv_evi  # EVI
+
+
+def build_features_numpy(bands, idx, out):
+    """
+    Vectorized NumPy equivalent of build_features_impl, used when Numba is
+    not installed. Same inputs and output layout, at the cost of a
+    temporary float32 copy of the valid pixels.
+    """
+    cols = bands[:, idx].astype(np.float32)
+    out[:, :6] = cols.T
+    
+    if out.shape[1] > 6:
+        r, g, b, n, s = cols[:5]
+        out[:, 6] = (n - r) / (n + r + INDEX_EPS)  # NDVI
+        out[:, 7] = (g - n) / (g + n + INDEX_EPS)  # NDWI
+        out[:, 8] = (s - n) / (s + n + INDEX_EPS)  # NDBI
+        
+        evi_denom = n + np.float32(6.0) * r - np.float32(7.5) * b + np.float32(10000.0)
+        inv_evi = np.divide(np.float32(1.0), evi_denom, out=np.zeros_like(evi_denom), where=evi_denom != 0)
+        out[:, 9] = np.float32(2.5) * (n - r) * inv_evi  # EVI
+
+
+# Prefer the ahead-of-time compiled kernel (built by build_feature_ext.py)
+# so short-lived runs skip JIT compilation; otherwise JIT it here, or use
+# NumPy when Numba is not installed
+try:
+    from feature_ext import build_features
+except ImportError:
+    if njit is not None:
+        build_features = njit(parallel=True, fastmath=True, cache=True)(build_features_impl)
+    else:
+        build_features = build_features_numpy
+
+
+def load_gpu_forest(clf):
+    """
+    Load a fitted RandomForest into cuML's Forest Inference Library (GPU)
+    
+    Returns a predict function, or None when cuML/CuPy or a GPU are not
+    available or the model type is not supported.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    if not isinstance(clf, RandomForestClassifier):
+        return None
+    
+    try:
+        import cupy
+        from cuml import ForestInference
+    except ImportError:
+        return None
+    
+    try:
+        fil = ForestInference.load_from_sklearn(clf, output_class=True)
+        classes = np.asarray(clf.classes_)
+        
+        def predict(X):
+            # FIL returns class indices; map them back to training labels
+            class_idx = fil.predict(cupy.asarray(X, dtype=cupy.float32))
+            return classes[cupy.asnumpy(class_idx).ravel().astype(np.intp)]
+        
+        print("[Classify] Using cuML Forest Inference (GPU) for prediction", file=sys.stderr)
+        return predict
+    except Exception as e:
+        print(f"[Classify] GPU forest inference unavailable: {e}", file=sys.stderr)
+        return None
+
+
+class TorchMLPClassifier:
+    """
+    Tiny MLP (features -> hidden -> classes) trained with PyTorch
+    
+    Mirrors the scikit-learn fit/predict/score interface. Runs on CUDA when
+    available, predicting in float16 as one batched forward pass per call.
+    """
+    
+    def __init__(self, hidden_units=32, epochs=200, learning_rate=0.01, random_state=42):
+        self.hidden_units = hidden_units
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.random_state = random_state
+    
+    def fit(self, X, y):
+        import torch
+        from torch import nn
+        
+        torch.manual_seed(self.random_state)
+        self.classes_, y_idx = np.unique(y, return_inverse=True)
+        self.device_ = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.model_ = nn.Sequential(
+            nn.Linear(X.shape[1], self.hidden_units),
+            nn.ReLU(),
+            nn.Linear(self.hidden_units, len(self.classes_))
+        ).to(self.device_)
+        
+        X_t = torch.from_numpy(np.ascontiguousarray(X, dtype=np.float32)).to(self.device_)
+        y_t = torch.from_numpy(y_idx.astype(np.int64)).to(self.device_)
+        optimizer = torch.optim.Adam(self.model_.parameters(), lr=self.learning_rate)
+        loss_fn = nn.CrossEntropyLoss()
+        
+        # The training set is a handful of points, so train full-batch
+        self.model_.train()
+        for _ in range(self.epochs):
+            optimizer.zero_grad()
+            loss = loss_fn(self.model_(X_t), y_t)
+            loss.backward()
+            optimizer.step()
+        
+        self.model_.eval()
+        if self.device_ == 'cuda':
+            self.model_.half()
+        return self
+    
+    def predict(self, X):
+        import torch
+        
+        X_t = torch.from_numpy(np.ascontiguousarray(X, dtype=np.float32)).to(self.device_)
+        if self.device_ == 'cuda':
+            X_t = X_t.half()
+        with torch.inference_mode():
+            class_idx = self.model_(X_t).argmax(dim=1).cpu().numpy()
+        return self.classes_[class_idx]
+    
+    def score(self, X, y):
+        return float(np.mean(self.predict(X) == y))
+
+
+def build_predictor(clf, n_features):
+    """
+    Pick the fastest available batch-prediction backend for a fitted model
+    
+    PyTorch models predict directly; random forests prefer GPU forest
+    inference, then ONNX Runtime (as does the scikit-learn MLP). Returns a
+    predict function, or None to use the scikit-learn path.
+    """
+    if isinstance(clf, TorchMLPClassifier):
+        print(f"[Classify] Using PyTorch ({clf.device_}) for prediction", file=sys.stderr)
+        return clf.predict
+    
+    predict = load_gpu_forest(clf)
+    if predict is not None:
+        return predict
     
-    return None
+    # skl2onnx's HistGradientBoosting conversion is unreliable across
+    # onnxruntime versions; use the scikit-learn path for it
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    if isinstance(clf, HistGradientBoostingClassifier):
+        return None
+    
+    try:
+        import onnxruntime as ort
+        from skl2onnx import to_onnx
+        
+        onx = to_onnx(
+            clf,
+            np.zeros((1, n_features), dtype=np.float32),
+            options={id(clf): {'zipmap': False}}
+        )
+        session = ort.InferenceSession(onx.SerializeToString(), providers=['CPUExecutionProvider'])
+        input_name = session.get_inputs()[0].name
+        label_name = session.get_outputs()[0].name
+        
+        def predict(X):
+            return session.run([label_name], {input_name: np.ascontiguousarray(X, dtype=np.float32)})[0]
+        
+        print("[Classify] Using ONNX Runtime for prediction", file=sys.stderr)
+        return predict
+    except Exception as e:
+        # Converter errors can embed the whole model graph; keep the log short
+        reason = str(e).splitlines()[0][:200] if str(e) else type(e).__name__
+        print(f"[Classify] ONNX Runtime unavailable, using scikit-learn predict: {reason}", file=sys.stderr)
+        return None
+
+
+# Per-process model state for predict_block (set by init_predict_worker)
+_worker_clf = None
+_worker_scaler = None
+
+
+def init_predict_worker(clf, scaler):
+    """Pool initializer: receive the fitted model once per worker process"""
+    global _worker_clf, _worker_scaler
+    # Parallelism comes from the pool; keep each worker single-threaded
+    clf.n_jobs = 1
+    _worker_clf = clf
+    _worker_scaler = scaler
+
+
+def predict_block(block):
+    """Scale and classify one block of feature rows in a worker process"""
+    block_scaled = _worker_scaler.transform(block).astype(np.float32, copy=False)
+    return _worker_clf.predict(block_scaled).astype(np.uint8)
 
 
 def classify_image(config):
@@ -63,16 +367,21 @@ def classify_image(config):
     """
     import rasterio
     from rasterio.warp import transform_bounds
+    from rasterio.warp import transform as transform_coords
     from rasterio.windows import from_bounds
-    import planetary_computer as pc
-    from sklearn.ensemble import RandomForestClassifier
-    from sklearn.preprocessing import StandardScaler
+    from rasterio.enums import Resampling
+    from rasterio.io import MemoryFile
+    from rasterio.shutil import copy as copy_dataset
+    from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.preprocessing import StandardScaler, FunctionTransformer
     
     training_data = config['training_data']
     stac_item_url = config['stac_item_url']
     collection = config.get('collection', 'sentinel-2-l2a')
     output_path = config['output_path']
     num_trees = config.get('num_trees', 50)
+    classifier = config.get('classifier', 'randomForest')
     include_indices = config.get('include_indices', True)
     
     print(f"[Classify] Starting classification with {len(training_data)} training points", file=sys.stderr)
@@ -99,16 +408,7 @@ def classify_image(config):
     band_urls = {}
     for band_name, asset_key in band_keys.items():
         if asset_key in assets:
-            url = assets[asset_key].get('href', '')
-            # Sign URL if needed (Planetary Computer)
-            if 'blob.core.windows.net' in url:
-                try:
-                    signed = pc.sign(url)
-                    band_urls[band_name] = signed
-                except:
-                    band_urls[band_name] = url
-            else:
-                band_urls[band_name] = url
+            band_urls[band_name] = sign_url(assets[asset_key].get('href', ''))
     
     if len(band_urls) < 4:
         raise ValueError(f"Not enough bands found. Got: {list(band_urls.keys())}")
@@ -123,7 +423,7 @@ def classify_image(config):
     sampled_classes = set()
     
     # Store primary image metadata
-    with rasterio.open(band_urls['nir']) as src:
+    with open_remote(band_urls['nir']) as src:
         src_crs = src.crs
         src_transform = src.transform
         src_bounds = src.bounds
@@ -136,57 +436,133 @@ def classify_image(config):
         urls = {}
         for band_name, asset_key in band_keys.items():
             if asset_key in item_assets:
-                url = item_assets[asset_key].get('href', '')
-                if 'blob.core.windows.net' in url:
-                    try:
-                        urls[band_name] = pc.sign(url)
-                    except:
-                        urls[band_name] = url
-                else:
-                    urls[band_name] = url
+                urls[band_name] = sign_url(item_assets[asset_key].get('href', ''))
         return urls
     
-    def sample_point_from_urls(point_band_urls, lon, lat):
-        """Sample band values at a point"""
-        band_values = {}
-        for band_name, url in point_band_urls.items():
+    def sample_points_from_urls(point_band_urls, lons, lats):
+        """Sample band values at many points, opening each band only once"""
+        def sample_band(item):
+            band_name, url = item
             try:
-                with rasterio.open(url) as src:
-                    from rasterio.warp import transform as transform_coords
-                    xs, ys = transform_coords('EPSG:4326', src.crs, [lon], [lat])
+                with open_remote(url) as src:
+                    xs, ys = transform_coords('EPSG:4326', src.crs, lons, lats)
+                    xs, ys = np.asarray(xs), np.asarray(ys)
                     
-                    if not (src.bounds.left <= xs[0] <= src.bounds.right and 
-                            src.bounds.bottom <= ys[0] <= src.bounds.top):
-                        continue
+                    # NaN marks points outside this band's footprint or on nodata
+                    values = np.full(len(xs), np.nan, dtype=np.float32)
+                    inside = ((xs >= src.bounds.left) & (xs < src.bounds.right) &
+                              (ys > src.bounds.bottom) & (ys <= src.bounds.top))
+                    n_inside = int(inside.sum())
+                    if n_inside:
+                        samples = src.sample(zip(xs[inside], ys[inside]), indexes=1)
+                        values[inside] = np.fromiter((v[0] for v in samples), dtype=np.float32, count=n_inside)
                     
-                    row, col = src.index(xs[0], ys[0])
-                    if 0 <= row < src.height and 0 <= col < src.width:
-                        window = rasterio.windows.Window(col, row, 1, 1)
-                        data = src.read(1, window=window)
-                        band_values[band_name] = float(data[0, 0])
+                    # Sentinel-2 DN 0 is nodata even when the file doesn't declare it
+                    nodata = src.nodata if src.nodata is not None else 0
+                    values[values == nodata] = np.nan
+                    return band_name, values
             except Exception as e:
-                pass
-        return band_values
+                return band_name, None
+        
+        # Each worker opens its own dataset; handles are not shared across threads
+        with ThreadPoolExecutor(max_workers=max(1, len(point_band_urls))) as executor:
+            results = executor.map(sample_band, point_band_urls.items())
+            return {band_name: values for band_name, values in results if values is not None}
     
-    for point in training_data:
+    lats = [p['lat'] for p in training_data]
+    lons = [p['lon'] for p in training_data]
+    
+    # Sample every point from the primary image in one pass per band
+    primary_samples = sample_points_from_urls(band_urls, lons, lats)
+    point_band_values = [
+        {
+            band_name: float(values[i])
+            for band_name, values in primary_samples.items()
+            if not np.isnan(values[i])
+        }
+        for i in range(len(training_data))
+    ]
+    
+    def has_valid_sample(band_values):
+        """A point is usable once it has at least 4 bands including NIR"""
+        return len(band_values) >= 4 and 'nir' in band_values
+    
+    def sample_item_points(entry):
+        """Sample a group of points from the STAC item that covers them"""
+        item, point_idx = entry
+        alt_band_urls = get_band_urls_for_item(item)
+        if len(alt_band_urls) < 4:
+            return point_idx, {}
+        return point_idx, sample_points_from_urls(
+            alt_band_urls,
+            [lons[i] for i in point_idx],
+            [lats[i] for i in point_idx]
+        )
+    
+    def apply_item_samples(point_idx, samples):
+        """Store fallback samples for points that came back usable"""
+        for j, i in enumerate(point_idx):
+            band_values = {
+                band_name: float(values[j])
+                for band_name, values in samples.items()
+                if not np.isnan(values[j])
+            }
+            if has_valid_sample(band_values):
+                point_band_values[i] = band_values
+    
+    def sample_point_from_search(i):
+        """Search around a single point and sample it from the first hit"""
+        point_bbox = [lons[i] - delta, lats[i] - delta, lons[i] + delta, lats[i] + delta]
+        point_items = search_stac_items(collection, point_bbox, limit=1)
+        if not point_items:
+            return [i], {}
+        return sample_item_points((point_items[0], [i]))
+    
+    # If not enough bands, run one STAC search covering every missed point
+    # and sample each point from the first returned item that contains it
+    delta = 0.01
+    missing = [i for i, band_values in enumerate(point_band_values) if not has_valid_sample(band_values)]
+    if missing:
+        miss_lons = [lons[i] for i in missing]
+        miss_lats = [lats[i] for i in missing]
+        search_bbox = [min(miss_lons) - delta, min(miss_lats) - delta, max(miss_lons) + delta, max(miss_lats) + delta]
+        print(f"[Classify] Searching for imagery covering {len(missing)} unsampled points...", file=sys.stderr)
+        items = search_stac_items(collection, search_bbox, limit=50)
+        
+        footprints = [item_footprint_contains(item) for item in items]
+        points_by_item = {}
+        for i in missing:
+            for item_idx, contains in enumerate(footprints):
+                if contains(lons[i], lats[i]):
+                    points_by_item.setdefault(item_idx, []).append(i)
+                    break
+        
+        groups = [(items[item_idx], point_idx) for item_idx, point_idx in points_by_item.items()]
+        if groups:
+            with ThreadPoolExecutor(max_workers=min(len(groups), 4)) as executor:
+                for point_idx, samples in executor.map(sample_item_points, groups):
+                    apply_item_samples(point_idx, samples)
+        
+        # Widely spread points can fall outside every item of the batched
+        # search; search around each remaining point individually
+        uncovered = [i for i in missing if not has_valid_sample(point_band_values[i])]
+        if uncovered:
+            print(f"[Classify] Searching individually for {len(uncovered)} points not covered by batched search...", file=sys.stderr)
+            with ThreadPoolExecutor(max_workers=min(len(uncovered), 16)) as executor:
+                for point_idx, samples in executor.map(sample_point_from_search, uncovered):
+                    apply_item_samples(point_idx, samples)
+        
+        unresolved = sum(1 for i in missing if not has_valid_sample(point_band_values[i]))
+        if unresolved:
+            print(f"[Classify] {unresolved} of {len(missing)} unsampled points could not be resolved from other imagery", file=sys.stderr)
+    
+    for point, band_values in zip(training_data, point_band_values):
         lat, lon = point['lat'], point['lon']
         label = point['label']
         class_name = point.get('class_name', f'class_{label}')
         
         try:
-            # First try primary image
-            band_values = sample_point_from_urls(band_urls, lon, lat)
-            
-            # If not enough bands, search for another image covering this point
-            if len(band_values) < 4:
-                print(f"[Classify] Searching for imagery at ({lat:.2f}, {lon:.2f})...", file=sys.stderr)
-                item = search_stac_for_point(collection, lon, lat)
-                if item:
-                    alt_band_urls = get_band_urls_for_item(item)
-                    if len(alt_band_urls) >= 4:
-                        band_values = sample_point_from_urls(alt_band_urls, lon, lat)
-            
-            if len(band_values) >= 4:
+            if has_valid_sample(band_values):
                 # Build feature vector
                 features = [
                     band_values.get('red', 0),
@@ -208,7 +584,8 @@ def classify_image(config):
                     ndvi = (nir - red) / (nir + red + 1e-10)
                     ndwi = (green - nir) / (green + nir + 1e-10)
                     ndbi = (swir - nir) / (swir + nir + 1e-10)
-                    evi = 2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 10000)
+                    evi_denom = nir + 6 * red - 7.5 * blue + 10000
+                    evi = 2.5 * (nir - red) / evi_denom if evi_denom != 0 else 0.0
                     
                     features.extend([ndvi, ndwi, ndbi, evi])
                 
@@ -228,42 +605,65 @@ def classify_image(config):
     
     print(f"[Classify] Sampled {len(feature_matrix)} training points from {len(sampled_classes)} classes", file=sys.stderr)
     
-    # Step 2: Train Random Forest
-    print("[Classify] Training Random Forest classifier...", file=sys.stderr)
+    # Step 2: Train classifier
+    if classifier == 'gradientBoosting':
+        classifier_name = 'Histogram Gradient Boosting (scikit-learn)'
+        # Binned, depth-limited boosted trees. The model is scale-invariant,
+        # so the scaler is a no-op passthrough.
+        scaler = FunctionTransformer()
+        clf = HistGradientBoostingClassifier(
+            max_iter=num_trees,
+            max_depth=6,
+            min_samples_leaf=1,
+            early_stopping=False,
+            random_state=42
+        )
+    elif classifier == 'mlp':
+        # Two dense layers: prediction is a pair of matmuls per batch
+        scaler = StandardScaler()
+        if importlib.util.find_spec('torch') is not None:
+            classifier_name = 'MLP (PyTorch)'
+            clf = TorchMLPClassifier(hidden_units=32, epochs=200, random_state=42)
+        else:
+            classifier_name = 'MLP (scikit-learn)'
+            clf = MLPClassifier(hidden_layer_sizes=(32,), max_iter=200, random_state=42)
+    else:
+        classifier_name = 'Random Forest (scikit-learn)'
+        scaler = StandardScaler()
+        clf = RandomForestClassifier(
+            n_estimators=num_trees,
+            max_features='sqrt',
+            n_jobs=-1,
+            random_state=42
+        )
     
-    X = np.array(feature_matrix)
+    print(f"[Classify] Training {classifier_name} classifier...", file=sys.stderr)
+    
+    # Keep features float32 end to end; trees split on float32 internally
+    X = np.asarray(feature_matrix, dtype=np.float32)
     y = np.array(labels)
     
     # Normalize features
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    X_scaled = scaler.fit_transform(X).astype(np.float32, copy=False)
     
     # Train classifier
-    clf = RandomForestClassifier(
-        n_estimators=num_trees,
-        max_features='sqrt',
-        n_jobs=-1,
-        random_state=42
-    )
     clf.fit(X_scaled, y)
     
     # Calculate training accuracy
     train_accuracy = clf.score(X_scaled, y)
     print(f"[Classify] Training accuracy: {train_accuracy:.2%}", file=sys.stderr)
     
+    predict = build_predictor(clf, X_scaled.shape[1])
+    
     # Step 3: Apply classification to full image
     print("[Classify] Applying classification to image...", file=sys.stderr)
     
     # Calculate a reasonable window to process (avoid memory issues)
     # Use the bounding box from training points with some buffer
-    lats = [p['lat'] for p in training_data]
-    lons = [p['lon'] for p in training_data]
-    
     min_lat, max_lat = min(lats) - 0.5, max(lats) + 0.5
     min_lon, max_lon = min(lons) - 0.5, max(lons) + 0.5
     
     # Transform bbox to image CRS
-    from rasterio.warp import transform as transform_coords
     xs, ys = transform_coords('EPSG:4326', src_crs, 
                                [min_lon, max_lon], [min_lat, max_lat])
     
@@ -277,16 +677,30 @@ def classify_image(config):
     # Use smaller output size (max 1000x1000) and read at low resolution for speed
     MAX_DIM = 1000
     
-    band_data = {}
-    window = None
-    out_transform = None
-    out_width = None
-    out_height = None
+    # Derive the output grid once from the primary (10m) band geometry
+    window = from_bounds(window_left, window_bottom, window_right, window_top, src_transform)
+    window_width = min(int(window.width), src_width - max(0, int(window.col_off)))
+    window_height = min(int(window.height), src_height - max(0, int(window.row_off)))
+    
+    # Always downsample to MAX_DIM for speed
+    scale = max(window_width / MAX_DIM, window_height / MAX_DIM, 1)
+    out_width = int(window_width / scale)
+    out_height = int(window_height / scale)
+    out_transform = rasterio.transform.from_bounds(
+        window_left, window_bottom, window_right, window_top,
+        out_width, out_height
+    )
+    
+    # Packed band block: one contiguous (height, width) plane per band in
+    # feature order; bands missing from the item stay zero
+    band_order = list(band_keys)
+    band_block = np.zeros((len(band_order), out_height, out_width), dtype=np.uint16)
     
-    for i, (band_name, url) in enumerate(band_urls.items()):
-        print(f"[Classify] Reading band {i+1}/{len(band_urls)}: {band_name}...", file=sys.stderr)
-        with rasterio.open(url) as src:
-            # Get window from bounds
+    def read_band(item):
+        """Read one band's window resampled onto the shared output grid, into its plane"""
+        band_name, url = item
+        with open_remote(url) as src:
+            # Get window from bounds (per band: 10m and 20m bands differ)
             window = from_bounds(window_left, window_bottom, window_right, window_top, src.transform)
             
             # Clamp window to valid range
@@ -297,67 +711,70 @@ def classify_image(config):
                 min(int(window.height), src.height - int(window.row_off))
             )
             
-            # Always downsample to MAX_DIM for speed (uses COG overviews)
-            if out_width is None:
-                scale = max(window.width / MAX_DIM, window.height / MAX_DIM, 1)
-                out_width = int(window.width / scale)
-                out_height = int(window.height / scale)
-                out_transform = rasterio.transform.from_bounds(
-                    window_left, window_bottom, window_right, window_top,
-                    out_width, out_height
-                )
-            
-            # Read with resampling (leverages COG overviews for speed)
-            data = src.read(
+            # Read with resampling (leverages COG overviews for speed); keep
+            # native uint16 DNs, build_features casts in-register
+            src.read(
                 1,
                 window=window,
-                out_shape=(out_height, out_width),
-                resampling=rasterio.enums.Resampling.bilinear
+                out=band_block[band_order.index(band_name)],
+                resampling=Resampling.bilinear
             )
-            
-            band_data[band_name] = data.astype(np.float32)
     
-    height, width = band_data['nir'].shape
+    print(f"[Classify] Reading {len(band_urls)} bands: {', '.join(band_urls)}...", file=sys.stderr)
+    
+    # All bands land on the same grid, so reads are independent and can overlap
+    with ThreadPoolExecutor(max_workers=len(band_urls)) as executor:
+        list(executor.map(read_band, band_urls.items()))
+    
+    height, width = out_height, out_width
     print(f"[Classify] Processing {width}x{height} pixels...", file=sys.stderr)
     
-    # Stack bands into feature array
-    n_features = 6 + (4 if include_indices else 0)
-    pixels = np.zeros((height * width, n_features), dtype=np.float32)
-    
-    # Fill base bands
-    pixels[:, 0] = band_data.get('red', np.zeros((height, width))).flatten()
-    pixels[:, 1] = band_data.get('green', np.zeros((height, width))).flatten()
-    pixels[:, 2] = band_data.get('blue', np.zeros((height, width))).flatten()
-    pixels[:, 3] = band_data.get('nir', np.zeros((height, width))).flatten()
-    pixels[:, 4] = band_data.get('swir16', np.zeros((height, width))).flatten()
-    pixels[:, 5] = band_data.get('swir22', np.zeros((height, width))).flatten()
-    
-    # Add indices
-    if include_indices:
-        nir = pixels[:, 3]
-        red = pixels[:, 0]
-        green = pixels[:, 1]
-        blue = pixels[:, 2]
-        swir = pixels[:, 4]
-        
-        pixels[:, 6] = (nir - red) / (nir + red + 1e-10)  # NDVI
-        pixels[:, 7] = (green - nir) / (green + nir + 1e-10)  # NDWI
-        pixels[:, 8] = (swir - nir) / (swir + nir + 1e-10)  # NDBI
-        pixels[:, 9] = 2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 10000)  # EVI
+    band_columns = band_block.reshape(len(band_order), height * width)
     
-    # Handle nodata (zeros typically mean no data)
-    valid_mask = (pixels[:, 3] > 0)  # NIR > 0 indicates valid pixel
+    # Handle nodata (zeros typically mean no data) up front, so only valid
+    # pixels are featurized, scaled and classified
+    valid_idx = np.flatnonzero(band_columns[band_order.index('nir')] > 0)  # NIR > 0 indicates valid pixel
+    n_valid = valid_idx.size
+    print(f"[Classify] {n_valid} valid pixels", file=sys.stderr)
     
-    # Scale features
-    pixels_scaled = scaler.transform(pixels)
+    # Stack valid pixels' bands and indices into feature array in one pass
+    n_features = 6 + (4 if include_indices else 0)
+    pixels = np.empty((n_valid, n_features), dtype=np.float32)
+    build_features(band_columns, valid_idx, pixels)
     
     # Classify
     print("[Classify] Running classification...", file=sys.stderr)
     classification = np.zeros(height * width, dtype=np.uint8)
     
-    # Only classify valid pixels
-    if np.any(valid_mask):
-        classification[valid_mask] = clf.predict(pixels_scaled[valid_mask])
+    # scikit-learn random forest: split into 256x256-pixel-sized blocks and
+    # classify them in worker processes, each with its own model copy.
+    # Threaded forest predict (n_jobs) serializes on summing per-tree
+    # probabilities for every row; per-block workers keep that sum local
+    # and cache-sized. HistGradientBoosting (OpenMP) and MLP (BLAS) are
+    # already parallel in-process, so a pool only adds spawn and pickling.
+    PREDICT_BLOCK = 65536
+    blocks = [(start, min(start + PREDICT_BLOCK, n_valid)) for start in range(0, n_valid, PREDICT_BLOCK)]
+    n_workers = min(len(blocks), os.cpu_count() or 1)
+    
+    if predict is None and isinstance(clf, RandomForestClassifier) and n_workers > 1:
+        # spawn, not fork: the parent has already started OpenMP/Numba threads
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(n_workers, initializer=init_predict_worker, initargs=(clf, scaler)) as pool:
+            results = pool.imap(predict_block, (pixels[start:end] for start, end in blocks))
+            for (start, end), block_labels in zip(blocks, results):
+                classification[valid_idx[start:end]] = block_labels
+    else:
+        # GPU/ONNX/PyTorch backends and the other scikit-learn models
+        # parallelize internally (and a single CPU gains nothing from a
+        # pool); scale and predict in fixed-size chunks so each batch stays
+        # cache-resident
+        if predict is None:
+            predict = clf.predict
+        PREDICT_CHUNK = 262144
+        for start in range(0, n_valid, PREDICT_CHUNK):
+            end = start + PREDICT_CHUNK
+            block_scaled = scaler.transform(pixels[start:end]).astype(np.float32, copy=False)
+            classification[valid_idx[start:end]] = predict(block_scaled)
     
     # Reshape to image
     classification = classification.reshape(height, width)
@@ -373,28 +790,55 @@ def classify_image(config):
         'count': 1,
         'crs': src_crs,
         'transform': out_transform,
-        'compress': 'lzw',
+        'tiled': True,
+        'blockxsize': 512,
+        'blockysize': 512,
+        'compress': 'deflate',
+        'predictor': 2,
         'nodata': 0
     }
     
-    with rasterio.open(output_path, 'w', **profile) as dst:
-        dst.write(classification, 1)
+    # Build tiles and overviews in memory, then copy them out with the
+    # overviews ahead of the full-resolution data (Cloud Optimized GeoTIFF
+    # layout) so tile servers can serve it with range requests directly
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as dst:
+            dst.write(classification, 1)
+            
+            # Add color table for visualization
+            colormap = {
+                0: (0, 0, 0, 0),  # nodata - transparent
+                1: (230, 25, 75, 255),    # Class 1 - Red
+                2: (60, 180, 75, 255),    # Class 2 - Green
+                3: (255, 225, 25, 255),   # Class 3 - Yellow
+                4: (67, 99, 216, 255),    # Class 4 - Blue
+                5: (245, 130, 49, 255),   # Class 5 - Orange
+                6: (145, 30, 180, 255),   # Class 6 - Purple
+                7: (66, 212, 244, 255),   # Class 7 - Cyan
+                8: (240, 50, 230, 255),   # Class 8 - Magenta
+                9: (191, 239, 69, 255),   # Class 9 - Lime
+                10: (250, 190, 212, 255), # Class 10 - Pink
+            }
+            dst.write_colormap(1, colormap)
+            
+            # Class labels must not be blended, so overviews use nearest
+            overview_factors = [f for f in (2, 4, 8, 16) if min(width, height) // f >= 64]
+            if overview_factors:
+                dst.build_overviews(overview_factors, Resampling.nearest)
         
-        # Add color table for visualization
-        colormap = {
-            0: (0, 0, 0, 0),  # nodata - transparent
-            1: (230, 25, 75, 255),    # Class 1 - Red
-            2: (60, 180, 75, 255),    # Class 2 - Green
-            3: (255, 225, 25, 255),   # Class 3 - Yellow
-            4: (67, 99, 216, 255),    # Class 4 - Blue
-            5: (245, 130, 49, 255),   # Class 5 - Orange
-            6: (145, 30, 180, 255),   # Class 6 - Purple
-            7: (66, 212, 244, 255),   # Class 7 - Cyan
-            8: (240, 50, 230, 255),   # Class 8 - Magenta
-            9: (191, 239, 69, 255),   # Class 9 - Lime
-            10: (250, 190, 212, 255), # Class 10 - Pink
-        }
-        dst.write_colormap(1, colormap)
+        with memfile.open() as src:
+            copy_dataset(
+                src,
+                output_path,
+                driver='GTiff',
+                copy_src_overviews=True,
+                tiled=True,
+                blockxsize=512,
+                blockysize=512,
+                compress='deflate',
+                predictor=2,
+                BIGTIFF='IF_SAFER'
+            )
     
     # Get unique classes from output
     unique_classes = np.unique(classification[classification > 0])
@@ -415,6 +859,7 @@ def classify_image(config):
         'output_path': output_path,
         'width': width,
         'height': height,
+        'classifier': classifier_name,
         'training_accuracy': float(train_accuracy),
         'training_samples': len(feature_matrix),
         'classes_in_output': [int(c) for c in unique_classes],
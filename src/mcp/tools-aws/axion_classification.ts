@@ -59,7 +59,7 @@ const ClassificationToolSchema = z.object({
   
   // ML Classification params
   trainingData: z.array(TrainingPointSchema).optional(),
-  classifier: z.enum(['randomForest', 'cart', 'svm']).optional(),
+  classifier: z.enum(['randomForest', 'gradientBoosting', 'mlp', 'cart', 'svm']).optional(),
   numberOfTrees: z.number().optional(),
   region: z.string().optional(),
   includeIndices: z.boolean().optional(),
@@ -562,6 +562,7 @@ async function classifyML(params: any) {
       collection,
       output_path: outputPath,
       num_trees: numberOfTrees,
+      classifier,
       include_indices: includeIndices
     });
     
@@ -650,7 +651,7 @@ async function classifyML(params: any) {
         classesRequested: classes.length,
         classesSampled: pythonResult.classes_sampled?.length || actualClasses.length,
         classesInOutput: actualClasses.length,
-        classifier: 'Random Forest (scikit-learn)',
+        classifier: pythonResult.classifier || 'Random Forest (scikit-learn)',
         numberOfTrees,
         trainingAccuracy: `${(pythonResult.training_accuracy * 100).toFixed(1)}%`
       },
@@ -974,7 +975,7 @@ function getHelp() {
       classify: {
         description: 'ML-based classification with custom training data (like GEE crop_classification)',
         params: ['bbox', 'startDate', 'endDate', 'trainingData', 'classifier', 'numberOfTrees', 'region'],
-        classifiers: ['randomForest', 'cart', 'svm'],
+        classifiers: ['randomForest', 'gradientBoosting', 'mlp', 'cart', 'svm'],
         supportedRegions: Object.keys(DEFAULT_TRAINING_DATA)
       },
       train: {